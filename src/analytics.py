@@ -1,43 +1,132 @@
 
+import os
 import sqlite3
+import stat
+import tempfile
 import pandas as pd
 import numpy as np
+from pyarrow import ArrowInvalid
+from db_utils import DAILY_AGG_QUERY
 
 DB_PATH = 'data/affiliate_commerce.db'
+READ_CHUNKSIZE = 100_000
+METRIC_COLS = ['impressions', 'clicks', 'orders', 'revenue', 'commission_paid']
+# Bump whenever DataLoader._load's output (query, dtypes, categoricals) changes,
+# so Parquet snapshots written by older code are not served
+SNAPSHOT_VERSION = 1
+CATEGORICAL_COLS = ['partner_name', 'vertical', 'campaign_name', 'landing_page_variant', 'device_type', 'channel']
+
+def _safe_divide(num, den):
+    """Element-wise num / den, 0.0 where den is not positive."""
+    return np.divide(num, den, out=np.zeros_like(num, dtype=np.float64), where=den > 0)
+
+def _kpi_ratios(grouped):
+    """Computes the ratio KPIs for a frame of summed metrics in one pass over its arrays."""
+    imp, clk, orders, rev, comm = grouped[METRIC_COLS].to_numpy(dtype=np.float64).T
+    return {
+        'CTR': _safe_divide(clk, imp),
+        'Conversion_Rate': _safe_divide(orders, clk),
+        'EPC': _safe_divide(rev, clk),
+        'AOV': _safe_divide(rev, orders),
+        'ROI': _safe_divide(rev - comm, comm),
+    }
 
 class DataLoader:
-    def __init__(self, db_path=DB_PATH):
+    def __init__(self, db_path=DB_PATH, use_cache=True):
         self.db_path = db_path
+        self.use_cache = use_cache
+
+    def get_data(self, granularity=None):
+        """Fetches joined data for analysis.
+        
+        With granularity='daily' the metrics are summed per
+        (date, partner, vertical, campaign, variant), which is all the
+        dashboard consumes; device_type/channel are dropped. The
+        pre-materialized daily_agg table is used when the loaders built it.
+        
+        Results are snapshotted to Parquet next to the database and reused
+        until the database file is modified.
+        """
+        if granularity not in (None, 'daily'):
+            raise ValueError(f"Unsupported granularity: {granularity!r}")
+        if not self.use_cache:
+            return self._load(granularity)
+        
+        cache_path = self._cache_path(granularity)
+        if os.path.exists(cache_path) and os.path.getmtime(cache_path) >= os.path.getmtime(self.db_path):
+            try:
+                return pd.read_parquet(cache_path)
+            except (OSError, ArrowInvalid):
+                pass # truncated/corrupt snapshot: treat as a cache miss and rebuild it
+        
+        df = self._load(granularity)
+        # Write to a temp file in the same directory and rename it into place, so
+        # readers (or a concurrent writer) never see a partially written snapshot
+        tmp_path = None
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(cache_path) or '.', suffix='.tmp.parquet')
+            os.close(fd)
+            df.to_parquet(tmp_path, compression='zstd', index=False)
+            # mkstemp creates 0600 files; give the snapshot the DB's permissions
+            os.chmod(tmp_path, stat.S_IMODE(os.stat(self.db_path).st_mode))
+            os.replace(tmp_path, cache_path)
+        except OSError:
+            pass # read-only data dir: serve uncached
+        finally:
+            if tmp_path and os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        return df
 
-    def get_data(self):
-        """Fetches joined data for analysis."""
+    def _cache_path(self, granularity):
+        return f"{os.path.splitext(self.db_path)[0]}.v{SNAPSHOT_VERSION}.{granularity or 'rows'}.parquet"
+
+    def _load(self, granularity):
+        """Runs the SQL query for `granularity` and normalises dtypes."""
         conn = sqlite3.connect(self.db_path)
         
         # We need to join Traffic and Conversions
         # Since both are daily aggregates by Campaign, we join on (campaign_id, date)
         
-        query = '''
-        SELECT 
-            t.date,
-            t.campaign_id,
-            t.device_type,
-            t.channel,
-            t.clicks,
-            t.impressions,
-            c.orders,
-            c.revenue,
-            c.commission_paid,
-            p.partner_name,
-            p.vertical,
-            camp.campaign_name,
-            camp.landing_page_variant
+        joins = '''
         FROM traffic t
         LEFT JOIN conversions c ON t.campaign_id = c.campaign_id AND t.date = c.date
         JOIN campaigns camp ON t.campaign_id = camp.campaign_id
         JOIN partners p ON camp.partner_id = p.partner_id
         '''
         
-        df = pd.read_sql(query, conn)
+        if granularity is None:
+            query = '''
+            SELECT 
+                t.date,
+                t.campaign_id,
+                t.device_type,
+                t.channel,
+                t.clicks,
+                t.impressions,
+                c.orders,
+                c.revenue,
+                c.commission_paid,
+                p.partner_name,
+                p.vertical,
+                camp.campaign_name,
+                camp.landing_page_variant
+            ''' + joins
+        elif granularity == 'daily' and self._has_table(conn, 'daily_agg'):
+            query = 'SELECT * FROM daily_agg'
+        elif granularity == 'daily':
+            # Older databases without daily_agg: aggregate on the fly
+            query = DAILY_AGG_QUERY
+        else:
+            raise ValueError(f"Unsupported granularity: {granularity!r}")
+        
+        # Stream in chunks so the driver never materialises the full result twice
+        # (orders/revenue/commission stay nullable until the fillna below)
+        chunks = pd.read_sql_query(
+            query, conn,
+            dtype={'impressions': 'int32', 'clicks': 'int32', 'revenue': 'float64', 'commission_paid': 'float64'},
+            chunksize=READ_CHUNKSIZE
+        )
+        df = pd.concat(chunks, ignore_index=True)
         conn.close()
         
         # Fill NaNs from Left Join (days with traffic but no sales)
@@ -48,8 +137,21 @@ class DataLoader:
         }, inplace=True)
         
         df['date'] = pd.to_datetime(df['date'])
+        
+        # Low-cardinality dimensions as Categorical (integer codes), counts at the smallest int width
+        for col in CATEGORICAL_COLS:
+            if col in df.columns:
+                df[col] = df[col].astype('category')
+        for col in ['impressions', 'clicks', 'orders']:
+            df[col] = pd.to_numeric(df[col], downcast='integer')
         return df
 
+    @staticmethod
+    def _has_table(conn, name):
+        return conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (name,)
+        ).fetchone() is not None
+
 class KPIEngine:
     @staticmethod
     def calculate_kpis(df):
@@ -77,48 +179,65 @@ class KPIEngine:
         
         return kpis, metrics
 
+    @staticmethod
+    def _group_sums(df, keys):
+        """Sums the metric columns per unique combination of `keys`.
+        
+        Keys are factorised with pd.factorize (sorted, so Categorical keys
+        follow category order), rows with a null in any key are dropped,
+        rows are sorted once by the combined code and each metric is reduced
+        with np.add.reduceat. Output is ordered by key, like
+        groupby(sort=True, observed=True).
+        """
+        uniques, codes = [], np.zeros(len(df), dtype=np.int64)
+        valid = np.ones(len(df), dtype=bool)
+        for key in keys:
+            inverse, levels = pd.factorize(df[key], sort=True)
+            valid &= inverse >= 0
+            codes = codes * max(len(levels), 1) + inverse
+            uniques.append(np.asarray(levels, dtype=object))
+        
+        codes = codes[valid]
+        if not len(codes):
+            # Keep the metric columns numeric (sums are int64/float64) so callers
+            # can still sort, format and plot an empty selection
+            empty = {key: np.array([], dtype=object) for key in keys}
+            for col in METRIC_COLS:
+                empty[col] = np.array([], dtype=np.int64 if df[col].dtype.kind in 'iub' else np.float64)
+            return pd.DataFrame(empty)
+        
+        order = np.argsort(codes, kind='stable')
+        sorted_codes = codes[order]
+        starts = np.flatnonzero(np.r_[True, sorted_codes[1:] != sorted_codes[:-1]])
+        
+        grouped = {}
+        group_codes = sorted_codes[starts]
+        for key, levels in reversed(list(zip(keys, uniques))):
+            grouped[key] = levels[group_codes % len(levels)]
+            group_codes = group_codes // len(levels)
+        grouped = {key: grouped[key] for key in keys}
+        for col in METRIC_COLS:
+            grouped[col] = np.add.reduceat(df[col].to_numpy()[valid][order], starts)
+        return pd.DataFrame(grouped)
+
     @staticmethod
     def get_partner_performance(df):
         """Returns a DataFrame of KPIs grouped by Partner."""
         
         # Group by partner_name AND vertical to preserve it
-        grouped = df.groupby(['partner_name', 'vertical']).agg({
-            'impressions': 'sum',
-            'clicks': 'sum',
-            'orders': 'sum',
-            'revenue': 'sum',
-            'commission_paid': 'sum'
-        }).reset_index()
+        grouped = KPIEngine._group_sums(df, ['partner_name', 'vertical'])
         
-        # Vectorized KPI calc
-        grouped['CTR'] = grouped['clicks'] / grouped['impressions']
-        grouped['Conversion_Rate'] = grouped['orders'] / grouped['clicks']
-        grouped['EPC'] = grouped['revenue'] / grouped['clicks']
-        grouped['AOV'] = grouped['revenue'] / grouped['orders']
-        grouped['ROI'] = (grouped['revenue'] - grouped['commission_paid']) / grouped['commission_paid']
-        
-        # Handle Inf/NaN
-        grouped.fillna(0, inplace=True)
-        return grouped
+        # Vectorized KPI calc (zero where the denominator is zero)
+        return grouped.assign(**_kpi_ratios(grouped))
 
     @staticmethod
     def get_campaign_performance(df):
         """Returns a DataFrame of KPIs grouped by Campaign."""
-        grouped = df.groupby(['campaign_name', 'landing_page_variant']).agg({
-            'impressions': 'sum',
-            'clicks': 'sum',
-            'orders': 'sum',
-            'revenue': 'sum',
-            'commission_paid': 'sum'
-        }).reset_index()
-        
-        grouped['CTR'] = grouped['clicks'] / grouped['impressions']
-        grouped['Conversion_Rate'] = grouped['orders'] / grouped['clicks']
-        grouped['EPC'] = grouped['revenue'] / grouped['clicks']
-        grouped['ROI'] = (grouped['revenue'] - grouped['commission_paid']) / grouped['commission_paid']
+        grouped = KPIEngine._group_sums(df, ['campaign_name', 'landing_page_variant'])
         
-        grouped.fillna(0, inplace=True)
-        return grouped
+        ratios = _kpi_ratios(grouped)
+        del ratios['AOV']
+        return grouped.assign(**ratios)
 
 class DataQuality:
     @staticmethod
@@ -127,30 +246,43 @@ class DataQuality:
         issues = []
         
         # 1. CTR > 100% (Clicks > Impressions)
-        invalid_ctr = df[df['clicks'] > df['impressions']]
-        if not invalid_ctr.empty:
-            issues.append(f"CRITICAL: Found {len(invalid_ctr)} rows where Clicks > Impressions.")
+        # Only counts are reported, so the predicates are summed on the raw arrays
+        # instead of materialising the offending rows
+        invalid_ctr = int((df['clicks'].to_numpy() > df['impressions'].to_numpy()).sum())
+        if invalid_ctr:
+            issues.append(f"CRITICAL: Found {invalid_ctr} rows where Clicks > Impressions.")
             
         # 2. Negative Revenue or Commission
-        neg_val = df[(df['revenue'] < 0) | (df['commission_paid'] < 0)]
-        if not neg_val.empty:
-            issues.append(f"CRITICAL: Found {len(neg_val)} rows with negative Revenue or Commission.")
+        neg_val = int(((df['revenue'].to_numpy() < 0) | (df['commission_paid'].to_numpy() < 0)).sum())
+        if neg_val:
+            issues.append(f"CRITICAL: Found {neg_val} rows with negative Revenue or Commission.")
             
         # 3. Nulls (should be handled by DataLoader, but checking raw cols)
-        nulls = df.isnull().sum().sum()
+        # Per column, without a widened copy: plain integer columns cannot hold
+        # nulls, floats are checked in place, everything else goes through isnull
+        nulls = 0
+        for col in df.columns:
+            series = df[col]
+            if isinstance(series.dtype, np.dtype) and series.dtype.kind in 'iub':
+                continue
+            if isinstance(series.dtype, np.dtype) and series.dtype.kind == 'f':
+                nulls += np.count_nonzero(np.isnan(series.to_numpy()))
+            elif series.hasnans:
+                nulls += int(series.isnull().sum())
         if nulls > 0:
             issues.append(f"WARNING: Found {nulls} missing values in dataset.")
             
         # 4. Outlier Detection (Z-Score on Revenue)
         # Filter for rows with revenue > 0
-        rev_data = df[df['revenue'] > 0]['revenue']
-        if not rev_data.empty:
-            mean = rev_data.mean()
-            std = rev_data.std()
-            z_scores = (rev_data - mean) / std
-            outliers = z_scores.abs() > 3
-            if outliers.sum() > 0:
-                issues.append(f"INFO: Detected {outliers.sum()} revenue outliers (>3 Std Dev).")
+        rev = df['revenue'].to_numpy(dtype=np.float64)
+        rev = rev[rev > 0]
+        if rev.size:
+            # Count |x - mean| > 3 * std directly instead of building a z-score Series
+            mean = rev.mean()
+            std = rev.std(ddof=1) if rev.size > 1 else np.nan
+            n_outliers = np.count_nonzero(np.abs(rev - mean) > 3 * std)
+            if n_outliers > 0:
+                issues.append(f"INFO: Detected {n_outliers} revenue outliers (>3 Std Dev).")
                 
         if not issues:
             issues.append("PASSED: All data quality checks passed.")
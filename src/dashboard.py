@@ -25,7 +25,55 @@ st.markdown("""
 @st.cache_data
 def load_data():
     loader = DataLoader()
-    return loader.get_data()
+    return loader.get_data(granularity='daily')
+
+def filter_data(df, date_lo, date_hi, verticals):
+    mask = (df['date'] >= pd.to_datetime(date_lo)) & (df['date'] <= pd.to_datetime(date_hi))
+    mask &= df['vertical'].isin(verticals)
+    return df[mask]
+
+# KPI tables are cached on the filter values only (dates + vertical tuple), so
+# reruns triggered by unrelated widgets reuse them instead of re-aggregating.
+@st.cache_data(ttl="5m", max_entries=32)
+def partner_performance(date_lo, date_hi, verticals):
+    return KPIEngine.get_partner_performance(filter_data(load_data(), date_lo, date_hi, verticals))
+
+@st.cache_data(ttl="5m", max_entries=32)
+def campaign_performance(date_lo, date_hi, verticals):
+    return KPIEngine.get_campaign_performance(filter_data(load_data(), date_lo, date_hi, verticals))
+
+@st.cache_data(ttl="5m", max_entries=32)
+def quality_issues(date_lo, date_hi, verticals):
+    return DataQuality.run_checks(filter_data(load_data(), date_lo, date_hi, verticals))
+
+@st.cache_data(ttl="5m", max_entries=32)
+def daily_trend(date_lo, date_hi, verticals):
+    filtered = filter_data(load_data(), date_lo, date_hi, verticals)
+    return filtered.groupby('date')[['revenue', 'commission_paid']].sum().reset_index()
+
+def revenue_trend_chart(filter_key):
+    st.subheader("Revenue & Commission Trend")
+    fig_trend = px.line(daily_trend(*filter_key), x='date', y=['revenue', 'commission_paid'], 
+                        labels={'value': 'Amount ($)', 'variable': 'Metric'},
+                        color_discrete_map={'revenue': '#0068c9', 'commission_paid': '#ff4b4b'})
+    st.plotly_chart(fig_trend, use_container_width=True)
+
+def partner_charts(partner_perf):
+    col_a, col_b = st.columns(2)
+    
+    with col_a:
+        st.subheader("Top Partners by Revenue")
+        top_partners = partner_perf.sort_values('revenue', ascending=False).head(10)
+        fig_bar = px.bar(top_partners, x='revenue', y='partner_name', orientation='h', 
+                         title="Top 10 Revenue Generators", color='revenue')
+        fig_bar.update_layout(yaxis={'categoryorder':'total ascending'})
+        st.plotly_chart(fig_bar, use_container_width=True)
+        
+    with col_b:
+        st.subheader("Efficiency (ROI vs Volume)")
+        fig_scatter = px.scatter(partner_perf, x='clicks', y='ROI', size='revenue', hover_name='partner_name',
+                                 color='vertical', title="Partner Efficiency Matrix")
+        st.plotly_chart(fig_scatter, use_container_width=True)
 
 df = load_data()
 
@@ -42,12 +90,12 @@ date_range = st.sidebar.date_input("Date Range", [min_date, max_date], min_value
 selected_vertical = st.sidebar.multiselect("Vertical", df['vertical'].unique(), default=df['vertical'].unique())
 
 # Filter Logic
-mask = (df['date'] >= pd.to_datetime(date_range[0])) & (df['date'] <= pd.to_datetime(date_range[1]))
-mask &= df['vertical'].isin(selected_vertical)
-filtered_df = df[mask]
+filter_key = (date_range[0], date_range[1], tuple(selected_vertical))
+filtered_df = filter_data(df, *filter_key)
 
 # KPIs
 kpis, metrics = KPIEngine.calculate_kpis(filtered_df)
+partner_perf = partner_performance(*filter_key) # shared by tabs 1, 2 and 4
 
 # Tabs
 tab1, tab2, tab3, tab4 = st.tabs(["Executive Summary", "Partner Performance", "Campaign Details", "Insights & Report"])
@@ -63,29 +111,8 @@ with tab1:
     col4.metric("Average Order Value", f"${kpis['AOV']:.2f}")
     
     # Charts
-    st.subheader("Revenue & Commission Trend")
-    daily_trend = filtered_df.groupby('date')[['revenue', 'commission_paid']].sum().reset_index()
-    fig_trend = px.line(daily_trend, x='date', y=['revenue', 'commission_paid'], 
-                        labels={'value': 'Amount ($)', 'variable': 'Metric'},
-                        color_discrete_map={'revenue': '#0068c9', 'commission_paid': '#ff4b4b'})
-    st.plotly_chart(fig_trend, use_container_width=True)
-    
-    col_a, col_b = st.columns(2)
-    
-    with col_a:
-        st.subheader("Top Partners by Revenue")
-        partner_perf = KPIEngine.get_partner_performance(filtered_df)
-        top_partners = partner_perf.sort_values('revenue', ascending=False).head(10)
-        fig_bar = px.bar(top_partners, x='revenue', y='partner_name', orientation='h', 
-                         title="Top 10 Revenue Generators", color='revenue')
-        fig_bar.update_layout(yaxis={'categoryorder':'total ascending'})
-        st.plotly_chart(fig_bar, use_container_width=True)
-        
-    with col_b:
-        st.subheader("Efficiency (ROI vs Volume)")
-        fig_scatter = px.scatter(partner_perf, x='clicks', y='ROI', size='revenue', hover_name='partner_name',
-                                 color='vertical', title="Partner Efficiency Matrix")
-        st.plotly_chart(fig_scatter, use_container_width=True)
+    revenue_trend_chart(filter_key)
+    partner_charts(partner_perf)
 
 with tab2:
     st.title("Partner Performance Drilldown")
@@ -101,10 +128,10 @@ with tab2:
 
 with tab3:
     st.title("Campaign Analysis")
-    camp_perf = KPIEngine.get_campaign_performance(filtered_df)
+    camp_perf = campaign_performance(*filter_key)
     
     st.subheader("A/B Test Variant Performance")
-    variant_perf = filtered_df.groupby('landing_page_variant').agg({
+    variant_perf = filtered_df.groupby('landing_page_variant', observed=True).agg({
         'clicks': 'sum', 'orders': 'sum', 'revenue': 'sum'
     }).reset_index()
     variant_perf['CVR'] = variant_perf['orders'] / variant_perf['clicks']
@@ -119,8 +146,7 @@ with tab3:
     st.dataframe(camp_perf)
     
     st.subheader("Data Quality Anomaly Detection")
-    dq = DataQuality()
-    issues = dq.run_checks(filtered_df)
+    issues = quality_issues(*filter_key)
     for issue in issues:
         if "CRITICAL" in issue:
             st.error(issue)
@@ -133,19 +159,21 @@ with tab4:
     st.title("Automated Stakeholder Report")
     
     # Simple Insight Logic
-    low_roi = partner_perf[partner_perf['ROI'] < 1.0]
-    high_roi = partner_perf[partner_perf['ROI'] > 4.0]
+    # Count on the mask first; only slice the table when there is something to show
+    roi = partner_perf['ROI'].to_numpy()
+    low_mask, high_mask = roi < 1.0, roi > 4.0
+    n_low, n_high = int(low_mask.sum()), int(high_mask.sum())
     
     st.markdown("#### 🚨 Underperforming Partners (ROI < 1.0)")
-    if not low_roi.empty:
-        st.markdown(f"Found **{len(low_roi)}** partners with negative or low ROI. Consider renegotiating terms or pausing.")
-        st.table(low_roi[['partner_name', 'ROI', 'revenue']])
+    if n_low:
+        st.markdown(f"Found **{n_low}** partners with negative or low ROI. Consider renegotiating terms or pausing.")
+        st.table(partner_perf.loc[low_mask, ['partner_name', 'ROI', 'revenue']])
     else:
         st.success("No critical underperformers detected.")
         
     st.markdown("#### 🚀 High Potential Opportunities (ROI > 4.0)")
-    if not high_roi.empty:
-        st.markdown(f"Found **{len(high_roi)}** partners with exceptional ROI. Recommend increasing budget/exposure.")
-        st.table(high_roi[['partner_name', 'ROI', 'revenue']])
+    if n_high:
+        st.markdown(f"Found **{n_high}** partners with exceptional ROI. Recommend increasing budget/exposure.")
+        st.table(partner_perf.loc[high_mask, ['partner_name', 'ROI', 'revenue']])
     
 
@@ -3,8 +3,9 @@ import sqlite3
 import pandas as pd
 import numpy as np
 import datetime
-import random
+import multiprocessing as mp
 import os
+from db_utils import SEED, connect_db, bulk_insert, build_daily_agg
 
 # Configuration
 DB_PATH = 'data/affiliate_commerce.db'
@@ -12,6 +13,9 @@ NUM_PARTNERS = 25
 NUM_CAMPAIGNS = 100
 START_DATE = datetime.date.today() - datetime.timedelta(days=180) # 6 months ago
 END_DATE = datetime.date.today()
+DATE_SHARD_DAYS = 30
+NUM_WORKERS = os.cpu_count() or 1
+PARALLEL_MIN_ROWS = 1_000_000 # below this, pool start-up costs more than the vectorized generation
 
 def init_db():
     """Initialize the SQLite database schema."""
@@ -70,136 +74,149 @@ def init_db():
         )
     ''')
     
+    # Covering indexes for the (campaign_id, date) join used by the analytics layer
+    cursor.execute('CREATE INDEX idx_traffic_camp_date ON traffic(campaign_id, date)')
+    cursor.execute('CREATE INDEX idx_conversions_camp_date ON conversions(campaign_id, date)')
+    
     conn.commit()
     conn.close()
     print("Database schema initialized.")
 
+def _generate_shard(args):
+    """Generates traffic and conversion columns for one block of dates."""
+    dates, rng, camp_ids, cvr_boosts = args
+    
+    device_types = ['Mobile', 'Desktop', 'Tablet']
+    channels = ['Organic', 'Social', 'Email', 'Paid Search']
+    
+    # Cartesian product of date x campaign, one slot per campaign/day
+    n_camps = len(camp_ids)
+    date_col = np.repeat(dates.date, n_camps)
+    camp_col = np.tile(camp_ids, len(dates))
+    boost_col = np.tile(cvr_boosts, len(dates))
+    seasonality_factor = np.repeat(np.where(dates.weekday >= 5, 1.2, 1.0), n_camps)
+    n = len(date_col)
+    
+    # Skip some campaigns on some days for realism
+    active = rng.random(n) >= 0.1
+    
+    # Base Impressions
+    # Certain verticals/partners get more traffic
+    impressions = (rng.lognormal(mean=6, sigma=1, size=n) * seasonality_factor).astype(int) # ~400-1000 range
+    
+    # Clicks (CTR 0.5% - 3%)
+    ctr_base = rng.beta(2, 100, size=n) # shape for low probabilities
+    clicks = np.minimum((impressions * ctr_base).astype(int), impressions)
+    
+    # No conversions if no clicks
+    keep = active & (clicks > 0)
+    date_col, camp_col, boost_col = date_col[keep], camp_col[keep], boost_col[keep]
+    impressions, clicks = impressions[keep], clicks[keep]
+    n = len(date_col)
+    
+    # Traffic Entry
+    # Simplified: 1 row per campaign/day with a predominant device/channel
+    traffic_data = {
+        'campaign_id': camp_col,
+        'date': date_col,
+        'impressions': impressions,
+        'clicks': clicks,
+        'device_type': rng.choice(device_types, n),
+        'channel': rng.choice(channels, n)
+    }
+    
+    # Conversions (CVR 2% - 8%)
+    # Some variance based on Landing Page Variant
+    cvr = rng.uniform(0.02, 0.08, n) * boost_col
+    orders = rng.binomial(clicks, cvr)
+    converted = orders > 0
+    
+    # Revenue (AOV $15 - $120)
+    aov = np.maximum(rng.normal(60, 20, n), 15)
+    revenue = np.where(converted, orders * aov, 0.0)
+    commission = revenue * rng.uniform(0.20, 0.40, n)
+    
+    conversion_data = {
+        'campaign_id': camp_col,
+        'date': date_col,
+        'orders': orders,
+        'revenue': np.round(revenue, 2),
+        'commission_paid': np.round(commission, 2),
+        'new_customer_flag': converted & (rng.random(n) < 0.5) # Simplified aggregate flag or dominant type
+    }
+    return traffic_data, conversion_data
+
 def generate_data():
     """Generates synthetic data for the affiliate platform."""
     
-    np.random.seed(42)
-    random.seed(42)
+    # PCG64 Generator: faster than the legacy global MT19937 state
+    rng = np.random.default_rng(SEED)
     
-    conn = sqlite3.connect(DB_PATH)
+    conn = connect_db(DB_PATH)
     
     # 1. Partners
     verticals = ['Tech', 'Fashion', 'Home', 'Beauty', 'Finance']
     tiers = ['Gold', 'Silver', 'Bronze']
     
-    partners = []
-    for i in range(1, NUM_PARTNERS + 1):
-        partners.append({
-            'partner_id': i,
-            'partner_name': f"Partner_{i}_{random.choice(['Media', 'Blog', 'News', 'Reviews'])}",
-            'vertical': random.choice(verticals),
-            'tier': random.choice(tiers)
-        })
-    pd.DataFrame(partners).to_sql('partners', conn, if_exists='append', index=False)
+    partner_ids = np.arange(1, NUM_PARTNERS + 1)
+    name_suffixes = rng.choice(['Media', 'Blog', 'News', 'Reviews'], NUM_PARTNERS)
+    partners = pd.DataFrame({
+        'partner_id': partner_ids,
+        'partner_name': [f"Partner_{i}_{suffix}" for i, suffix in zip(partner_ids, name_suffixes)],
+        'vertical': rng.choice(verticals, NUM_PARTNERS),
+        'tier': rng.choice(tiers, NUM_PARTNERS)
+    })
+    bulk_insert(conn, 'partners', partners)
     
     # 2. Campaigns
-    campaigns = []
-    for i in range(1, NUM_CAMPAIGNS + 1):
-        partner = random.choice(partners)
-        campaigns.append({
-            'campaign_id': i,
-            'partner_id': partner['partner_id'],
-            'campaign_name': f"{partner['vertical']}_Promo_{i}",
-            'vertical': partner['vertical'],
-            'start_date': START_DATE,
-            'end_date': END_DATE,
-            'landing_page_variant': random.choice(['A', 'B'])
-        })
-    pd.DataFrame(campaigns).to_sql('campaigns', conn, if_exists='append', index=False)
+    # Each campaign is assigned a random partner and inherits its vertical
+    campaign_ids = np.arange(1, NUM_CAMPAIGNS + 1)
+    campaigns = pd.DataFrame({
+        'campaign_id': campaign_ids,
+        'partner_id': rng.integers(1, NUM_PARTNERS + 1, NUM_CAMPAIGNS)
+    }).merge(partners[['partner_id', 'vertical']], on='partner_id', how='left')
+    campaigns['campaign_name'] = campaigns['vertical'] + '_Promo_' + campaigns['campaign_id'].astype(str)
+    campaigns['start_date'] = START_DATE
+    campaigns['end_date'] = END_DATE
+    campaigns['landing_page_variant'] = rng.choice(['A', 'B'], NUM_CAMPAIGNS)
+    bulk_insert(conn, 'campaigns', campaigns[
+        ['campaign_id', 'partner_id', 'campaign_name', 'vertical', 'start_date', 'end_date', 'landing_page_variant']
+    ])
     
     # 3. Traffic & Conversions
     # Generate daily data
     
     date_range = pd.date_range(start=START_DATE, end=END_DATE)
     
-    traffic_data = []
-    conversion_data = []
-    
-    device_types = ['Mobile', 'Desktop', 'Tablet']
-    channels = ['Organic', 'Social', 'Email', 'Paid Search']
-    
     print("Generating daily traffic and conversion data...")
     
-    for date in date_range:
-        is_weekend = date.weekday() >= 5
-        seasonality_factor = 1.2 if is_weekend else 1.0
-        
-        for camp in campaigns:
-            # Skip some campaigns on some days for realism
-            if random.random() < 0.1:
-                continue
-                
-            # Base Impressions
-            # Certain verticals/partners get more traffic
-            base_impressions = np.random.lognormal(mean=6, sigma=1) * seasonality_factor # ~400-1000 range
-            impressions = int(base_impressions)
-            
-            # Clicks (CTR 0.5% - 3%)
-            ctr_base = np.random.beta(2, 100) # shape for low probabilities
-            clicks = int(impressions * ctr_base)
-            if clicks > impressions: clicks = impressions
-            if clicks == 0: continue # No conversions if no clicks
-            
-            # Traffic Entry
-            # Distribute across devices/channels (simplified: one entry per campaign/day aggregate to keep DB small, 
-            # or we create multiple rows? Prompt implies 'traffic' table has these cols. 
-            # To show granularity, let's create 1-2 rows per campaign per day with split metrics)
-            
-            # Simplified: 1 row per campaign/day
-            traffic_data.append({
-                'campaign_id': camp['campaign_id'],
-                'date': date.date(),
-                'impressions': impressions,
-                'clicks': clicks,
-                'device_type': random.choice(device_types), # Predominant device
-                'channel': random.choice(channels)
-            })
-            
-            # Conversions (CVR 2% - 8%)
-            # Some variance based on Landing Page Variant
-            cvr_boost = 1.15 if camp['landing_page_variant'] == 'B' else 1.0
-            cvr = np.random.uniform(0.02, 0.08) * cvr_boost
-            
-            orders = np.random.binomial(clicks, cvr)
-            
-            if orders > 0:
-                # Revenue (AOV $15 - $120)
-                aov = np.random.normal(60, 20)
-                if aov < 15: aov = 15
-                
-                revenue = orders * aov
-                commission_rate = np.random.uniform(0.20, 0.40)
-                commission = revenue * commission_rate
-                
-                conversion_data.append({
-                    'campaign_id': camp['campaign_id'],
-                    'date': date.date(),
-                    'orders': orders,
-                    'revenue': round(revenue, 2),
-                    'commission_paid': round(commission, 2),
-                    'new_customer_flag': random.choice([True, False]) # Simplified aggregate flag or dominant type
-                })
-            else:
-                 conversion_data.append({
-                    'campaign_id': camp['campaign_id'],
-                    'date': date.date(),
-                    'orders': 0,
-                    'revenue': 0.0,
-                    'commission_paid': 0.0,
-                    'new_customer_flag': False
-                })
+    # Dates are independent, so the range is split into fixed-size shards with
+    # their own child generators; output does not depend on the worker count.
+    shards = [date_range[i:i + DATE_SHARD_DAYS] for i in range(0, len(date_range), DATE_SHARD_DAYS)]
+    camp_ids = campaigns['campaign_id'].to_numpy()
+    cvr_boosts = np.where(campaigns['landing_page_variant'] == 'B', 1.15, 1.0)
+    tasks = [(shard, child, camp_ids, cvr_boosts) for shard, child in zip(shards, rng.spawn(len(shards)))]
+    
+    workers = min(NUM_WORKERS, len(tasks))
+    if workers > 1 and len(date_range) * len(camp_ids) >= PARALLEL_MIN_ROWS:
+        with mp.Pool(workers) as pool:
+            results = pool.map(_generate_shard, tasks)
+    else:
+        results = list(map(_generate_shard, tasks))
+    
+    traffic_data = {col: np.concatenate([t[col] for t, _ in results]) for col in results[0][0]}
+    conversion_data = {col: np.concatenate([c[col] for _, c in results]) for col in results[0][1]}
 
     # Bulk Insert
     print("Inserting data into DB...")
     traffic_df = pd.DataFrame(traffic_data)
-    pd.DataFrame(traffic_data).to_sql('traffic', conn, if_exists='append', index=False)
+    bulk_insert(conn, 'traffic', traffic_df)
     
     conversion_df = pd.DataFrame(conversion_data)
-    pd.DataFrame(conversion_data).to_sql('conversions', conn, if_exists='append', index=False)
+    bulk_insert(conn, 'conversions', conversion_df)
+    
+    print("Building daily aggregate...")
+    build_daily_agg(conn)
     
     conn.commit()
     conn.close()
@@ -3,10 +3,12 @@ import sqlite3
 import pandas as pd
 import numpy as np
 import os
+from db_utils import SEED, connect_db, bulk_insert, build_daily_agg
 
 # Configuration
 CSV_PATH = 'dataset/amazon_affiliate_clicks.csv'
 DB_PATH = 'data/affiliate_commerce.db'
+CSV_COLUMNS = ['timestamp', 'utm_source', 'utm_campaign', 'utm_medium', 'device_type', 'product_price']
 
 def init_db():
     """Initialize the SQLite database schema."""
@@ -62,23 +64,55 @@ def init_db():
         )
     ''')
     
+    # Covering indexes for the (campaign_id, date) join used by the analytics layer
+    cursor.execute('CREATE INDEX idx_traffic_camp_date ON traffic(campaign_id, date)')
+    cursor.execute('CREATE INDEX idx_conversions_camp_date ON conversions(campaign_id, date)')
+    
     conn.commit()
     conn.close()
     print("Database schema initialized.")
 
+def simulate_conversions(price, rng):
+    """Simulates click-level conversions from product price.
+    
+    Returns (is_converted, revenue, commission) arrays computed in a single
+    fused pass over preallocated buffers, without per-step DataFrame columns.
+    """
+    n = len(price)
+    # Both per-click draws come from one block: row 0 decides conversion, row 1 the commission rate
+    random_draw, commission = rng.random((2, n))
+    # Base CVR 5%. Product Category modifiers could be added.
+    # Higher price -> Lower conversion
+    # Simple logic: CVR = Base * (100 / Price) ... clamped
+    # Cheap items convert higher; cap between 1% and 15%
+    cvr_prob = np.add(price, 10.0)
+    np.divide(0.05 * 50.0, cvr_prob, out=cvr_prob) # Heuristic
+    np.clip(cvr_prob, 0.01, 0.15, out=cvr_prob)
+    is_converted = random_draw < cvr_prob
+    
+    # Calculate revenue for converted rows
+    # Commission rate 20-30%
+    revenue = np.where(is_converted, price, 0.0)
+    commission *= 0.10
+    commission += 0.20
+    np.multiply(commission, revenue, out=commission)
+    return is_converted, revenue, commission
+
 def ingest_and_augment():
+    rng = np.random.default_rng(SEED)
+    
     print(f"Reading {CSV_PATH}...")
-    df = pd.read_csv(CSV_PATH)
+    # Only the columns used below; the multi-threaded Arrow parser skips the rest
+    df = pd.read_csv(CSV_PATH, engine='pyarrow', usecols=CSV_COLUMNS, dtype_backend='pyarrow')
     
     # Preprocessing
-    df['timestamp'] = pd.to_datetime(df['timestamp'])
+    df['timestamp'] = pd.to_datetime(df['timestamp'], format='ISO8601')
     df['date'] = df['timestamp'].dt.date
     
     # specific fix for 'device_type' if needed, assuming column exists as per head command
     # Columns seen: click_id,user_id,session_id,timestamp,product_asin,... device_type ... utm_source, utm_medium, utm_campaign
     
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
+    conn = connect_db(DB_PATH)
     
     # 1. Populate Partners (from utm_source)
     print("Populating Partners...")
@@ -86,12 +120,12 @@ def ingest_and_augment():
     partners_df = pd.DataFrame({'partner_name': unique_partners})
     # Assign a random vertical for variety if not inferable
     verticals = ['Tech', 'Fashion', 'Home', 'Beauty', 'Finance']
-    partners_df['vertical'] = [np.random.choice(verticals) for _ in range(len(partners_df))]
+    partners_df['vertical'] = rng.choice(verticals, len(partners_df))
     partners_df.reset_index(inplace=True)
     partners_df.rename(columns={'index': 'partner_id'}, inplace=True)
     partners_df['partner_id'] += 1 # 1-based ID
     
-    partners_df.to_sql('partners', conn, if_exists='append', index=False)
+    bulk_insert(conn, 'partners', partners_df)
     
     # Helper map for partner mapping later
     partner_map = dict(zip(partners_df['partner_name'], partners_df['partner_id']))
@@ -103,7 +137,7 @@ def ingest_and_augment():
     unique_campaigns = df[['utm_source', 'utm_campaign']].drop_duplicates()
     unique_campaigns['partner_id'] = unique_campaigns['utm_source'].map(partner_map)
     unique_campaigns['campaign_name'] = unique_campaigns['utm_campaign']
-    unique_campaigns['landing_page_variant'] = [np.random.choice(['A', 'B']) for _ in range(len(unique_campaigns))]
+    unique_campaigns['landing_page_variant'] = rng.choice(['A', 'B'], len(unique_campaigns))
     
     unique_campaigns.reset_index(drop=True, inplace=True)
     unique_campaigns.reset_index(inplace=True)
@@ -112,53 +146,53 @@ def ingest_and_augment():
     
     # Select cols for DB
     campaigns_db = unique_campaigns[['campaign_id', 'partner_id', 'campaign_name', 'landing_page_variant']]
-    campaigns_db.to_sql('campaigns', conn, if_exists='append', index=False)
+    bulk_insert(conn, 'campaigns', campaigns_db)
     
     # Map for later
-    # Create a compound key dict: (source, campaign_name) -> campaign_id
-    camp_map = dict(zip(zip(unique_campaigns['utm_source'], unique_campaigns['utm_campaign']), unique_campaigns['campaign_id']))
+    # Compound key lookup: (source, campaign_name) -> campaign_id
+    camp_map = pd.Series(
+        unique_campaigns['campaign_id'].values,
+        index=pd.MultiIndex.from_arrays([unique_campaigns['utm_source'], unique_campaigns['utm_campaign']])
+    )
     
     # 3. Process Traffic (Impressions & Click counts)
     print("Processing Traffic...")
     # Group by key dims
     traffic_groups = df.groupby(['date', 'utm_source', 'utm_campaign', 'device_type', 'utm_medium']).size().reset_index(name='clicks')
     
-    traffic_rows = []
-    
-    for _, row in traffic_groups.iterrows():
-        camp_id = camp_map.get((row['utm_source'], row['utm_campaign']))
-        if not camp_id: continue
-        
-        clicks = row['clicks']
-        
-        # Back-calculate Impressions
-        # Random CTR between 0.5% and 3.5%
-        ctr = np.random.uniform(0.005, 0.035) 
-        impressions = int(clicks / ctr)
-        if impressions < clicks: impressions = clicks # Safety
-        
-        traffic_rows.append({
-            'campaign_id': camp_id,
-            'date': row['date'],
-            'device_type': row['device_type'],
-            'channel': row['utm_medium'],
-            'impressions': impressions,
-            'clicks': clicks
-        })
-        
-    pd.DataFrame(traffic_rows).to_sql('traffic', conn, if_exists='append', index=False)
+    traffic_groups['campaign_id'] = pd.MultiIndex.from_arrays(
+        [traffic_groups['utm_source'], traffic_groups['utm_campaign']]
+    ).map(camp_map)
+    traffic_groups = traffic_groups.dropna(subset=['campaign_id'])
+    
+    # Back-calculate Impressions
+    # Random CTR between 0.5% and 3.5%
+    clicks = traffic_groups['clicks'].to_numpy()
+    ctr = rng.uniform(0.005, 0.035, len(traffic_groups))
+    impressions = np.maximum((clicks / ctr).astype(np.int64), clicks) # Safety: never fewer impressions than clicks
+    
+    traffic_df = pd.DataFrame({
+        'campaign_id': traffic_groups['campaign_id'].astype(np.int64).to_numpy(),
+        'date': traffic_groups['date'].to_numpy(),
+        'device_type': traffic_groups['device_type'].to_numpy(),
+        'channel': traffic_groups['utm_medium'].to_numpy(),
+        'impressions': impressions,
+        'clicks': clicks
+    })
+    bulk_insert(conn, 'traffic', traffic_df)
     
     # 4. Simulate Conversions
     print("Simulating Conversions...")
     # We can iterate through the raw DataFrame to "simulate" based on product price/category
     # Or just do it at the aggregate level for simplicity and speed.
-    # Let's do it at aggregate level using the traffic_rows but we need to know what products were clicked to be accurate about Revenue...
+    # Let's do it at aggregate level using the traffic_df but we need to know what products were clicked to be accurate about Revenue...
     # Actually, the CSV has 'product_price'. We should probably aggregate by product too? 
     # Or just average product price for that day/campaign?
     # Let's go back to the raw DF for accurate Revenue simulation.
     
     # Add campaign_id to main df
-    df['campaign_id'] = df.apply(lambda x: camp_map.get((x['utm_source'], x['utm_campaign'])), axis=1)
+    # Vectorized lookup on the (source, campaign) pair instead of a per-row apply
+    df['campaign_id'] = pd.MultiIndex.from_arrays([df['utm_source'], df['utm_campaign']]).map(camp_map)
     
     conversion_rows = []
     
@@ -166,24 +200,8 @@ def ingest_and_augment():
     # But first, determine 'is_converted' row by row
     
     # Vectorized conversion simulation
-    # Base CVR 5%. Product Category modifiers could be added.
-    np.random.seed(42)
-    df['random_draw'] = np.random.random(len(df))
-    # Higher price -> Lower conversion
-    # Simple logic: CVR = Base * (100 / Price) ... clamped
-    # Let's say baseline CVR is ~5%
-    # Adjust based on price: Cheap items convert higher.
-    # We don't have infinite time, simple heuristic:
-    df['cvr_prob'] = 0.05 * (50.0 / (df['product_price'] + 10)) # Heuristic
-    df['cvr_prob'] = df['cvr_prob'].clip(0.01, 0.15) # Cap between 1% and 15%
-    
-    df['is_converted'] = df['random_draw'] < df['cvr_prob']
-    
-    # Calculate revenue for converted rows
-    # Commission rate 20-30%
-    df['commission_rate'] = np.random.uniform(0.20, 0.30, len(df))
-    df['revenue_amt'] = np.where(df['is_converted'], df['product_price'], 0)
-    df['commission_amt'] = df['revenue_amt'] * df['commission_rate']
+    price = df['product_price'].to_numpy(dtype=np.float64)
+    df['is_converted'], df['revenue_amt'], df['commission_amt'] = simulate_conversions(price, rng)
     
     # Aggregate to creation Convs table
     conv_agg = df.groupby(['date', 'campaign_id']).agg({
@@ -203,12 +221,15 @@ def ingest_and_augment():
     # Actually, just inserting non-zero rows is fine, or all rows. 
     # Let's insert all rows where traffic existed (which matches our grouping).
     
-    conv_agg.to_sql('conversions', conn, if_exists='append', index=False)
+    bulk_insert(conn, 'conversions', conv_agg)
+    
+    print("Building daily aggregate...")
+    build_daily_agg(conn)
     
     conn.commit()
     conn.close()
     
-    print(f"Data ingestion complete. {len(traffic_rows)} traffic records, {len(conv_agg)} conversion records.")
+    print(f"Data ingestion complete. {len(traffic_df)} traffic records, {len(conv_agg)} conversion records.")
 
 if __name__ == "__main__":
     if not os.path.exists('data'):
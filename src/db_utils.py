@@ -0,0 +1,59 @@
+
+import datetime
+import sqlite3
+from itertools import islice
+
+# Configuration shared by the loader scripts
+INSERT_CHUNKSIZE = 50_000
+SEED = 42
+
+# Store dates as ISO 'YYYY-MM-DD' text explicitly; sqlite3's built-in date
+# adapter is deprecated from Python 3.12
+sqlite3.register_adapter(datetime.date, datetime.date.isoformat)
+
+def connect_db(db_path):
+    """Opens a connection tuned for one-shot bulk loading."""
+    conn = sqlite3.connect(db_path)
+    # The DB is rebuilt from scratch on every run, so durability is traded for load speed
+    conn.execute('PRAGMA journal_mode=MEMORY')
+    conn.execute('PRAGMA synchronous=OFF')
+    conn.execute('PRAGMA temp_store=MEMORY')
+    conn.execute('PRAGMA cache_size=-200000')
+    return conn
+
+def bulk_insert(conn, table, df, chunksize=INSERT_CHUNKSIZE):
+    """Inserts a DataFrame into `table` with batched executemany calls (no commit)."""
+    sql = f"INSERT INTO {table} ({', '.join(df.columns)}) VALUES ({', '.join('?' * len(df.columns))})"
+    # Series.tolist() yields native Python scalars that sqlite3 can bind directly;
+    # rows are materialised one chunk at a time to bound peak memory
+    rows = zip(*(df[col].tolist() for col in df.columns))
+    while chunk := list(islice(rows, chunksize)):
+        conn.executemany(sql, chunk)
+
+# Daily dashboard aggregate. Materialized as daily_agg by the loaders and run
+# directly by analytics.DataLoader on databases built before that table existed.
+DAILY_AGG_QUERY = '''
+    SELECT 
+        t.date,
+        p.partner_name,
+        p.vertical,
+        camp.campaign_name,
+        camp.landing_page_variant,
+        SUM(t.impressions) AS impressions,
+        SUM(t.clicks) AS clicks,
+        COALESCE(SUM(c.orders), 0) AS orders,
+        COALESCE(SUM(c.revenue), 0.0) AS revenue,
+        COALESCE(SUM(c.commission_paid), 0.0) AS commission_paid
+    FROM traffic t
+    LEFT JOIN conversions c ON t.campaign_id = c.campaign_id AND t.date = c.date
+    JOIN campaigns camp ON t.campaign_id = camp.campaign_id
+    JOIN partners p ON camp.partner_id = p.partner_id
+    GROUP BY 1, 2, 3, 4, 5
+'''
+
+def build_daily_agg(conn):
+    """Materializes the daily dashboard aggregate so readers skip the 4-way join."""
+    conn.execute('DROP TABLE IF EXISTS daily_agg')
+    conn.execute('CREATE TABLE daily_agg AS ' + DAILY_AGG_QUERY)
+    conn.execute('CREATE INDEX idx_daily_agg_date ON daily_agg(date)')
+    conn.execute('CREATE INDEX idx_daily_agg_partner ON daily_agg(partner_name)')
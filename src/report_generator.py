@@ -13,6 +13,11 @@ def generate_report():
     top_partners = partner_perf.sort_values('revenue', ascending=False).head(5)
     underperformers = partner_perf[partner_perf['ROI'] < 1.0]
     
+    leaderboard = ''.join(
+        f"| {r.partner_name} | ${r.revenue:.2f} | {r.ROI:.2f} | ${r.EPC:.2f} |\n"
+        for r in top_partners.itertuples(index=False)
+    )
+    
     report = f"""
 # Affiliate Commerce Stakeholder Report 📈
 **Generated on**: {pd.Timestamp.now().strftime('%Y-%m-%d %H:%M:%S')}
@@ -35,11 +40,7 @@ def generate_report():
 ## Partner Leaderboard (Top 5)
 | Partner | Revenue | ROI | EPC |
 |---------|---------|-----|-----|
-"""
-    for _, row in top_partners.iterrows():
-        report += f"| {row['partner_name']} | ${row['revenue']:.2f} | {row['ROI']:.2f} | ${row['EPC']:.2f} |\n"
-
-    report += """
+{leaderboard}
 ## Next Steps
 * Deploy budget to high-ROI partners.
 * Investigate 'Zero Conversation' campaigns.